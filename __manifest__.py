@@ -4,7 +4,8 @@
 {
     'name': 'Nómina Colombiana',
     'category': 'Human Resources',
-    'depends': ['hr_payroll'],
+    'version': '12.0.1.1',
+    'depends': ['hr_payroll', 'hr_payroll_account'],
     'description': """
 Nomina Colombiana
 ======================
@@ -13,7 +14,13 @@ Nomina Colombiana
     """,
 
     'data': [
+        'security/ir.model.access.csv',
         'views/l10n_co_hr_payroll_view.xml',
         'data/l10n_co_hr_payroll_data.xml',
+        'data/hr_salary_rule_data.xml',
+        'data/ir_cron_data.xml',
+        'data/hr_leave_aggregate_data.xml',
+        'data/hr_payslip_aggregate_data.xml',
+        'data/hr_payroll_bank_layout_data.xml',
     ],
 }
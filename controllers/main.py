@@ -0,0 +1,32 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from werkzeug.exceptions import BadRequest
+
+from odoo import http
+from odoo.exceptions import ValidationError
+from odoo.http import request
+
+
+class PayrollExport(http.Controller):
+
+    @http.route('/l10n_co_hr_payroll/export', type='http', auth='user', methods=['GET'])
+    def export_payslips(self, date_from, date_to, cursor=None, limit=1000, **kwargs):
+        """ Return one page of payslips as JSON lines. The cursor of the next
+        page is sent in the ``X-Next-Cursor`` header, absent on the last page. """
+        try:
+            lines, next_cursor = request.env['hr.payslip'].export_period(
+                date_from, date_to, cursor=cursor, limit=min(int(limit), 10000))
+        except (ValueError, ValidationError) as e:
+            raise BadRequest(str(e))
+        headers = [('Content-Type', 'application/x-ndjson; charset=utf-8')]
+        if next_cursor:
+            headers.append(('X-Next-Cursor', next_cursor))
+        return request.make_response('\n'.join(lines) + ('\n' if lines else ''), headers=headers)
+
+    @http.route('/l10n_co_hr_payroll/bank_file/<int:wizard_id>', type='http', auth='user')
+    def download_bank_file(self, wizard_id, **kwargs):
+        wizard = request.env['hr.payroll.bank.file'].browse(wizard_id).exists()
+        if not wizard or wizard.state != 'done':
+            return request.not_found()
+        return http.send_file(wizard._get_file_path(), filename=wizard.file_name, as_attachment=True)
@@ -0,0 +1,12 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # the aggregates are built at install by data files, databases upgraded
+    # from a previous version get them here
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['hr.leave.aggregate']._rebuild()
+    env['hr.payslip.aggregate']._rebuild()
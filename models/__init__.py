@@ -3,3 +3,10 @@
 
 from . import l10n_co_hr_payroll
 from . import hr_payroll
+from . import hr_payslip_line_archive
+from . import hr_leave_aggregate
+from . import hr_payroll_account
+from . import hr_payslip_variance
+from . import hr_payslip_export
+from . import hr_payroll_bank_file
+from . import hr_contract_liquidacion
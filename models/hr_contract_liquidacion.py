@@ -0,0 +1,175 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from datetime import date
+
+from odoo import api, fields, models
+
+
+def days360(date_from, date_to):
+    """ Days between two dates, both included, with the 30 days per month
+    commercial calendar used for Colombian social benefits. """
+    day_from = min(date_from.day, 30)
+    day_to = min(date_to.day, 30)
+    if date_to.month == 2 and date_to.day in (28, 29):
+        day_to = 30
+    return ((date_to.year - date_from.year) * 360 + (date_to.month - date_from.month) * 30
+            + day_to - day_from + 1)
+
+
+class HrPayslipAggregate(models.Model):
+    _name = 'hr.payslip.aggregate'
+    _description = 'Acumulados de nómina por contrato y periodo'
+    _order = 'contract_id, date'
+
+    contract_id = fields.Many2one('hr.contract', string='Contrato', required=True, ondelete='cascade')
+    date = fields.Date(string='Mes', required=True)
+    sueldo = fields.Float(string='Sueldo')
+    prestacionales = fields.Float(string='Base prestacionales')
+    aux_transporte = fields.Float(string='Auxilio de transporte')
+    dias_trabajados = fields.Float(string='Días trabajados')
+
+    _sql_constraints = [
+        ('contract_date_uniq', 'unique(contract_id, date)', 'Solo puede haber un acumulado por contrato y mes.'),
+    ]
+
+    @api.model
+    def _add_payslips(self, payslips):
+        """ Add the amounts of confirmed ``payslips`` to the monthly aggregates
+        of their contract, credit notes being subtracted. The lines of archived
+        payslips are read from their archive. """
+        if not payslips:
+            return
+        archived = payslips.filtered('lineas_archivadas')
+        codes = ('SUELDO', 'PRESTACIONALES', 'AUX_TRANSPORTE')
+        totals = self.env['hr.payslip.line.archive']._get_totals(archived.ids, codes)
+        archived_ids = list(totals)
+        self.env.cr.execute("""
+            INSERT INTO hr_payslip_aggregate (contract_id, date, sueldo, prestacionales,
+                                              aux_transporte, dias_trabajados,
+                                              create_uid, create_date, write_uid, write_date)
+            SELECT p.contract_id, date_trunc('month', p.date_to)::date,
+                   sum(CASE WHEN p.credit_note THEN -1 ELSE 1 END * coalesce(l.sueldo, 0)),
+                   sum(CASE WHEN p.credit_note THEN -1 ELSE 1 END * coalesce(l.prestacionales, 0)),
+                   sum(CASE WHEN p.credit_note THEN -1 ELSE 1 END * coalesce(l.aux_transporte, 0)),
+                   sum(CASE WHEN p.credit_note THEN -1 ELSE 1 END * coalesce(w.dias, 0)),
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM hr_payslip p
+         LEFT JOIN (SELECT slip_id,
+                           sum(total) FILTER (WHERE code = 'SUELDO') AS sueldo,
+                           sum(total) FILTER (WHERE code = 'PRESTACIONALES') AS prestacionales,
+                           sum(total) FILTER (WHERE code = 'AUX_TRANSPORTE') AS aux_transporte
+                      FROM hr_payslip_line
+                     WHERE slip_id IN %(ids)s
+                       AND code IN ('SUELDO', 'PRESTACIONALES', 'AUX_TRANSPORTE')
+                  GROUP BY slip_id
+                 UNION ALL
+                    SELECT * FROM unnest(%(archived_ids)s::integer[], %(archived_sueldo)s::numeric[],
+                                         %(archived_prestacionales)s::numeric[],
+                                         %(archived_aux_transporte)s::numeric[])
+                        AS a (slip_id, sueldo, prestacionales, aux_transporte)) l ON l.slip_id = p.id
+         LEFT JOIN (SELECT payslip_id, sum(number_of_days) AS dias
+                      FROM hr_payslip_worked_days
+                     WHERE payslip_id IN %(ids)s AND code = 'DIAS_TRABAJADOS'
+                  GROUP BY payslip_id) w ON w.payslip_id = p.id
+             WHERE p.id IN %(ids)s AND p.contract_id IS NOT NULL
+          GROUP BY p.contract_id, date_trunc('month', p.date_to)
+                ON CONFLICT (contract_id, date) DO UPDATE
+               SET sueldo = hr_payslip_aggregate.sueldo + EXCLUDED.sueldo,
+                   prestacionales = hr_payslip_aggregate.prestacionales + EXCLUDED.prestacionales,
+                   aux_transporte = hr_payslip_aggregate.aux_transporte + EXCLUDED.aux_transporte,
+                   dias_trabajados = hr_payslip_aggregate.dias_trabajados + EXCLUDED.dias_trabajados,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, {
+            'ids': tuple(payslips.ids),
+            'uid': self.env.uid,
+            'archived_ids': archived_ids,
+            'archived_sueldo': [totals[slip_id].get('SUELDO', 0.0) for slip_id in archived_ids],
+            'archived_prestacionales': [totals[slip_id].get('PRESTACIONALES', 0.0) for slip_id in archived_ids],
+            'archived_aux_transporte': [totals[slip_id].get('AUX_TRANSPORTE', 0.0) for slip_id in archived_ids],
+        })
+        self.invalidate_cache()
+
+    @api.model
+    def _rebuild(self):
+        self.env.cr.execute("DELETE FROM hr_payslip_aggregate")
+        payslips = self.env['hr.payslip'].search([('state', '=', 'done')])
+        for index in range(0, len(payslips), 5000):
+            self._add_payslips(payslips[index:index + 5000])
+
+
+class HrPayslip(models.Model):
+    _inherit = 'hr.payslip'
+
+    @api.multi
+    def action_payslip_done(self):
+        res = super(HrPayslip, self).action_payslip_done()
+        self.env['hr.payslip.aggregate']._add_payslips(self)
+        return res
+
+
+class HrContract(models.Model):
+    _inherit = 'hr.contract'
+
+    @api.multi
+    def compute_liquidacion(self, date_end=None):
+        """ Compute the settlement of the contracts at ``date_end`` (their end
+        date, or today, by default) from the monthly payslip aggregates.
+
+        The bases are the average monthly PRESTACIONALES plus auxilio de
+        transporte of the year (cesantías) and of the semester (prima).
+        Pending vacations use the employee's remaining legal leaves.
+
+        :return: dict {contract id: dict of the settlement amounts}
+        """
+        res = {}
+        Aggregate = self.env['hr.payslip.aggregate']
+        for contract_end, contracts in self._group_by_end_date(date_end).items():
+            year_start = date(contract_end.year, 1, 1)
+            semester_start = date(contract_end.year, 1 if contract_end.month <= 6 else 7, 1)
+            bases = {}
+            for period, period_start in (('year', year_start), ('semester', semester_start)):
+                for group in Aggregate.read_group([
+                    ('contract_id', 'in', contracts.ids),
+                    ('date', '>=', period_start),
+                    ('date', '<=', contract_end),
+                ], ['contract_id', 'prestacionales', 'aux_transporte', 'dias_trabajados'], ['contract_id']):
+                    bases[(group['contract_id'][0], period)] = group
+
+            for contract in contracts:
+                liquidacion = {'date_end': contract_end}
+                for period, period_start in (('year', year_start), ('semester', semester_start)):
+                    group = bases.get((contract.id, period))
+                    if group and group['dias_trabajados']:
+                        base = (group['prestacionales'] + group['aux_transporte']) * 30 / group['dias_trabajados']
+                    else:
+                        base = contract.wage
+                    days = max(days360(max(period_start, contract.date_start), contract_end), 0)
+                    liquidacion[period] = (base, days)
+                base, days = liquidacion.pop('year')
+                cesantias = base * days / 360
+                intereses = cesantias * 0.12 * days / 360
+                base, days = liquidacion.pop('semester')
+                prima = base * days / 360
+                vacaciones = contract.wage * contract.employee_id.remaining_leaves / 30
+                liquidacion.update({
+                    'cesantias': cesantias,
+                    'intereses_cesantias': intereses,
+                    'prima': prima,
+                    'vacaciones': vacaciones,
+                    'total': cesantias + intereses + prima + vacaciones,
+                })
+                res[contract.id] = liquidacion
+        return res
+
+    @api.multi
+    def _group_by_end_date(self, date_end=None):
+        groups = {}
+        today = fields.Date.context_today(self)
+        for contract in self:
+            contract_end = date_end or contract.date_end or today
+            contract_end = fields.Date.to_date(contract_end)
+            groups.setdefault(contract_end, self.browse())
+            groups[contract_end] |= contract
+        return groups
@@ -0,0 +1,196 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from datetime import datetime, time, timedelta
+from pytz import timezone
+
+from odoo import api, fields, models, tools, _
+
+
+class HrLeaveAggregate(models.Model):
+    _name = 'hr.leave.aggregate'
+    _description = 'Ausencias agregadas por día'
+    _order = 'employee_id, date'
+
+    employee_id = fields.Many2one('hr.employee', string='Empleado', required=True, ondelete='cascade')
+    resource_calendar_id = fields.Many2one('resource.calendar', string='Horario', required=True,
+                                           ondelete='cascade')
+    holiday_status_id = fields.Many2one('hr.leave.type', string='Tipo de ausencia', ondelete='cascade')
+    date = fields.Date(string='Fecha', required=True)
+    number_of_days = fields.Float(string='Días')
+    number_of_hours = fields.Float(string='Horas')
+
+    @api.model_cr_context
+    def _auto_init(self):
+        res = super(HrLeaveAggregate, self)._auto_init()
+        tools.create_index(self._cr, 'hr_leave_aggregate_employee_calendar_date_index',
+                           self._table, ['employee_id', 'resource_calendar_id', 'date'])
+        return res
+
+    @api.model
+    def _refresh(self, employee, calendar, date_from, date_to):
+        """ Rebuild the daily leave aggregates of ``employee`` for ``calendar``
+        between ``date_from`` and ``date_to`` (dates, inclusive). """
+        self.search([
+            ('employee_id', '=', employee.id),
+            ('resource_calendar_id', '=', calendar.id),
+            ('date', '>=', date_from),
+            ('date', '<=', date_to),
+        ]).unlink()
+
+        tz = timezone(calendar.tz)
+        aggregates = {}
+        day_leave_intervals = employee.list_leaves(
+            datetime.combine(date_from, time.min), datetime.combine(date_to, time.max),
+            calendar=calendar)
+        for day, hours, leave in day_leave_intervals:
+            key = (day, leave.holiday_id.holiday_status_id.id)
+            aggregate = aggregates.setdefault(key, {
+                'employee_id': employee.id,
+                'resource_calendar_id': calendar.id,
+                'holiday_status_id': key[1],
+                'date': day,
+                'number_of_days': 0.0,
+                'number_of_hours': 0.0,
+            })
+            aggregate['number_of_hours'] += hours
+            work_hours = calendar.get_work_hours_count(
+                tz.localize(datetime.combine(day, time.min)),
+                tz.localize(datetime.combine(day, time.max)),
+                compute_leaves=False,
+            )
+            if work_hours:
+                aggregate['number_of_days'] += hours / work_hours
+        self.env['hr.payslip'].sudo().mark_stale([
+            ('employee_id', '=', employee.id),
+            ('date_from', '<=', date_to),
+            ('date_to', '>=', date_from),
+        ])
+        return self.create(list(aggregates.values()))
+
+    @api.model
+    def _get_leave_lines(self, contract, date_from, date_to):
+        """ Return the leave worked-day lines of ``contract`` between
+        ``date_from`` and ``date_to``, summed per leave type. """
+        groups = self.read_group([
+            ('employee_id', '=', contract.employee_id.id),
+            ('resource_calendar_id', '=', contract.resource_calendar_id.id),
+            ('date', '>=', date_from),
+            ('date', '<=', date_to),
+        ], ['holiday_status_id', 'number_of_days', 'number_of_hours'], ['holiday_status_id'])
+        # read the names, the display name of a leave type depends on the context
+        names = {
+            leave_type['id']: leave_type['name']
+            for leave_type in self.env['hr.leave.type'].browse([
+                group['holiday_status_id'][0] for group in groups if group['holiday_status_id']
+            ]).read(['name'])
+        }
+        res = []
+        for group in groups:
+            name = group['holiday_status_id'] and names[group['holiday_status_id'][0]]
+            res.append({
+                'name': name or _('Global Leaves'),
+                'sequence': 5,
+                'code': name or 'GLOBAL',
+                'number_of_days': group['number_of_days'],
+                'number_of_hours': group['number_of_hours'],
+                'contract_id': contract.id,
+            })
+        return res
+
+    @api.model
+    def _rebuild(self):
+        self.search([]).unlink()
+        self.env['resource.calendar.leaves'].search([])._refresh_leave_aggregates()
+
+
+class ResourceCalendarLeaves(models.Model):
+    _inherit = 'resource.calendar.leaves'
+
+    @api.multi
+    def _leave_aggregate_scope(self):
+        """ Return a dict {(employee, calendar): (date_from, date_to)} covering
+        the aggregates impacted by these leaves. """
+        Contract = self.env['hr.contract']
+        scope = {}
+        for leave in self:
+            if leave.resource_id:
+                contracts = Contract.search([
+                    ('employee_id.resource_id', '=', leave.resource_id.id),
+                    ('resource_calendar_id', '!=', False),
+                    ('state', '!=', 'cancel'),
+                ])
+            elif leave.calendar_id:
+                contracts = Contract.search([
+                    ('resource_calendar_id', '=', leave.calendar_id.id),
+                    ('state', '!=', 'cancel'),
+                ])
+            else:
+                continue
+            # leave datetimes are in UTC, widen by one day to cover the calendar timezone
+            date_from = leave.date_from.date() - timedelta(days=1)
+            date_to = leave.date_to.date() + timedelta(days=1)
+            for contract in contracts:
+                key = (contract.employee_id, contract.resource_calendar_id)
+                if key in scope:
+                    scope[key] = (min(date_from, scope[key][0]), max(date_to, scope[key][1]))
+                else:
+                    scope[key] = (date_from, date_to)
+        return scope
+
+    @api.multi
+    def _refresh_leave_aggregates(self, scope=None):
+        Aggregate = self.env['hr.leave.aggregate'].sudo()
+        if scope is None:
+            scope = self._leave_aggregate_scope()
+        for (employee, calendar), (date_from, date_to) in scope.items():
+            Aggregate._refresh(employee, calendar, date_from, date_to)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        leaves = super(ResourceCalendarLeaves, self).create(vals_list)
+        leaves._refresh_leave_aggregates()
+        return leaves
+
+    @api.multi
+    def write(self, vals):
+        scope = self._leave_aggregate_scope()
+        res = super(ResourceCalendarLeaves, self).write(vals)
+        for key, (date_from, date_to) in self._leave_aggregate_scope().items():
+            if key in scope:
+                scope[key] = (min(date_from, scope[key][0]), max(date_to, scope[key][1]))
+            else:
+                scope[key] = (date_from, date_to)
+        self._refresh_leave_aggregates(scope)
+        return res
+
+    @api.multi
+    def unlink(self):
+        scope = self._leave_aggregate_scope()
+        res = super(ResourceCalendarLeaves, self).unlink()
+        self.browse()._refresh_leave_aggregates(scope)
+        return res
+
+
+class HrContract(models.Model):
+    _inherit = 'hr.contract'
+
+    @api.multi
+    def _refresh_leave_aggregates(self):
+        self.env['resource.calendar.leaves'].search([
+            '|', ('resource_id', 'in', self.mapped('employee_id.resource_id').ids),
+            '&', ('resource_id', '=', False), ('calendar_id', 'in', self.mapped('resource_calendar_id').ids),
+        ])._refresh_leave_aggregates()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        contracts = super(HrContract, self).create(vals_list)
+        contracts.filtered('resource_calendar_id')._refresh_leave_aggregates()
+        return contracts
+
+    @api.multi
+    def write(self, vals):
+        res = super(HrContract, self).write(vals)
+        if 'resource_calendar_id' in vals:
+            self._refresh_leave_aggregates()
+        return res
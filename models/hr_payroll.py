@@ -0,0 +1,511 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import csv
+import hashlib
+import json
+import logging
+import time
+
+import psycopg2
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import UserError
+from odoo.modules.module import get_module_resource
+
+_logger = logging.getLogger(__name__)
+
+MODULE = 'l10n_co_hr_payroll'
+
+
+class HrSalaryRule(models.Model):
+    _inherit = 'hr.salary.rule'
+
+    @api.model
+    def _l10n_co_read_rule_rows(self, filename):
+        path = get_module_resource(MODULE, 'data', filename)
+        with tools.file_open(path, 'r') as csv_file:
+            return list(csv.DictReader(csv_file))
+
+    @api.model
+    def _l10n_co_resolve_references(self, rows):
+        """ Resolve every external id and category name referenced by the
+        rows with one query each, instead of one lookup per cell. """
+        xmlids = set()
+        category_names = set()
+        for row in rows:
+            for column, value in row.items():
+                if column.endswith('/id') and value:
+                    xmlids.add(value if '.' in value else '%s.%s' % (MODULE, value))
+            if row.get('category_id'):
+                category_names.add(row['category_id'])
+
+        references = {}
+        if xmlids:
+            domain = ['|'] * (len(xmlids) - 1)
+            for xmlid in xmlids:
+                module, name = xmlid.split('.', 1)
+                domain += ['&', ('module', '=', module), ('name', '=', name)]
+            for data in self.env['ir.model.data'].search_read(domain, ['module', 'name', 'res_id']):
+                references['%s.%s' % (data['module'], data['name'])] = data['res_id']
+
+        categories = {}
+        if category_names:
+            for category in self.env['hr.salary.rule.category'].search_read(
+                    [('name', 'in', list(category_names))], ['name']):
+                categories.setdefault(category['name'], category['id'])
+        return references, categories
+
+    @api.model
+    def _l10n_co_convert_rule_row(self, row, references, categories):
+        """ Convert a CSV row into ``hr.salary.rule`` values, or return the
+        list of references that could not be resolved. """
+        vals = {}
+        missing = []
+        for column, value in row.items():
+            if column == 'id':
+                continue
+            if column.endswith('/id'):
+                fname = column[:-3]
+                if not value:
+                    vals[fname] = False
+                    continue
+                xmlid = value if '.' in value else '%s.%s' % (MODULE, value)
+                if xmlid not in references:
+                    missing.append(value)
+                    continue
+                vals[fname] = references[xmlid]
+            elif column == 'category_id':
+                if value not in categories:
+                    missing.append(value)
+                    continue
+                vals[column] = categories[value]
+            else:
+                field = self._fields[column]
+                if field.type == 'float':
+                    vals[column] = float(value or 0.0)
+                elif field.type == 'integer':
+                    vals[column] = int(value or 0)
+                else:
+                    vals[column] = value or False
+        return vals, missing
+
+    @api.model
+    def _l10n_co_rule_changes(self, vals, current):
+        changes = {}
+        for fname, value in vals.items():
+            old = current[fname]
+            if isinstance(old, tuple):
+                old = old[0]
+            if self._fields[fname].type == 'float':
+                if tools.float_compare(value, old or 0.0, precision_digits=6):
+                    changes[fname] = value
+            elif value != old:
+                changes[fname] = value
+        return changes
+
+    @api.model
+    def _l10n_co_load_rule_data(self, filename='hr.salary.rule.csv', batch_size=500, raise_if_missing=False):
+        """ Load the salary rule table shipped in ``data/<filename>``.
+
+        Incoming rows are diffed against the records already bound to their
+        external ids: only new rows are created and only changed fields are
+        written, grouping records that receive the same values into a single
+        ``write``. Upgrading with unchanged data is therefore a no-op.
+
+        Nothing is loaded if a row references a record that does not exist:
+        the missing references are logged, or raised with ``raise_if_missing``.
+        The external ids are created ``noupdate`` so that rules loaded by a
+        manual call are not removed by a later upgrade of the module.
+        """
+        start = time.time()
+        rows = self._l10n_co_read_rule_rows(filename)
+        references, categories = self._l10n_co_resolve_references(rows)
+
+        # records not marked as loaded are deleted by ir.model.data._process_end
+        # at the end of the install/upgrade, unchanged rows included
+        for row in rows:
+            self.pool.loaded_xmlids.add('%s.%s' % (MODULE, row['id']))
+
+        IrModelData = self.env['ir.model.data']
+        existing = {
+            data['name']: data['res_id']
+            for data in IrModelData.search_read([
+                ('module', '=', MODULE),
+                ('model', '=', self._name),
+                ('name', 'in', [row['id'] for row in rows]),
+            ], ['name', 'res_id'])
+        }
+        fnames = [column[:-3] if column.endswith('/id') else column
+                  for column in (rows[0] if rows else {}) if column != 'id']
+        current = {
+            rule['id']: rule
+            for rule in self.browse(list(existing.values())).exists().read(fnames)
+        }
+
+        converted = []
+        unresolved = set()
+        invalid_rows = 0
+        for row in rows:
+            vals, missing = self._l10n_co_convert_rule_row(row, references, categories)
+            if missing:
+                unresolved.update(missing)
+                invalid_rows += 1
+            converted.append((row, vals))
+        if unresolved:
+            message = _('%s: %d salary rules reference records that do not exist: %s') % (
+                filename, invalid_rows, ', '.join(sorted(unresolved)))
+            if raise_if_missing:
+                raise UserError(message)
+            _logger.warning('%s, nothing loaded', message)
+            return {'created': 0, 'updated': 0, 'unchanged': 0, 'duration': time.time() - start}
+
+        to_create = []
+        to_write = {}
+        unchanged = 0
+        for row, vals in converted:
+            res_id = existing.get(row['id'])
+            if res_id not in current:
+                to_create.append((row['id'], vals))
+                continue
+            changes = self._l10n_co_rule_changes(vals, current[res_id])
+            if changes:
+                key = tuple(sorted(changes.items()))
+                to_write.setdefault(key, []).append(res_id)
+            else:
+                unchanged += 1
+
+        for key, ids in to_write.items():
+            self.browse(ids).write(dict(key))
+
+        stale_xmlids = [name for name, _dummy in to_create if name in existing]
+        if stale_xmlids:
+            IrModelData.search([
+                ('module', '=', MODULE),
+                ('model', '=', self._name),
+                ('name', 'in', stale_xmlids),
+            ]).unlink()
+        for index in range(0, len(to_create), batch_size):
+            batch = to_create[index:index + batch_size]
+            rules = self.create([vals for _name, vals in batch])
+            IrModelData.create([{
+                'module': MODULE,
+                'model': self._name,
+                'name': name,
+                'res_id': rule.id,
+                'noupdate': True,
+            } for (name, _vals), rule in zip(batch, rules)])
+
+        result = {
+            'created': len(to_create),
+            'updated': sum(len(ids) for ids in to_write.values()),
+            'unchanged': unchanged,
+            'duration': time.time() - start,
+        }
+        _logger.info('%s: %d created, %d updated, %d unchanged in %.2fs',
+                     filename, result['created'], result['updated'], result['unchanged'],
+                     result['duration'])
+        return result
+
+
+# Contract fields read by the Colombian rules or by the worked days and
+# inputs of the payslip: changing them makes draft payslips stale.
+STALE_CONTRACT_FIELDS = (
+    'wage', 'porcentaje_comision', 'rodamiento', 'comision_es_prestacional',
+    'bono_es_prestacional', 'rodamiento_es_prestacional', 'resource_calendar_id',
+)
+
+# Payslip line fields that are not copied when the lines of a payslip are
+# reused for another payslip with the same inputs.
+LINE_COPY_EXCLUDED_FIELDS = ('id', 'slip_id', 'total', 'create_uid', 'create_date',
+                             'write_uid', 'write_date', '__last_update')
+
+# Worked day lines generated with a fixed code by get_worked_day_lines,
+# every other worked day line comes from a leave.
+WORKED_DAY_CODES = ('DIAS_TRABAJADOS', 'HED', 'HEN', 'HEF', 'HEFN')
+
+
+class HrContract(models.Model):
+    _inherit = 'hr.contract'
+
+    @api.multi
+    def write(self, vals):
+        res = super(HrContract, self).write(vals)
+        if any(fname in vals for fname in STALE_CONTRACT_FIELDS):
+            self.env['hr.payslip'].sudo().mark_stale([('contract_id', 'in', self.ids)])
+        return res
+
+
+class HrPayslip(models.Model):
+    _inherit = 'hr.payslip'
+
+    desactualizada = fields.Boolean(
+        string='Desactualizada',
+        readonly=True,
+        copy=False,
+        index=True,
+        help='El contrato o las ausencias del empleado cambiaron después de calcular esta nómina.'
+    )
+
+    hash_entradas = fields.Char(
+        string='Hash de entradas',
+        readonly=True,
+        copy=False,
+        index=True,
+        help='Huella del contrato, días trabajados, entradas y reglas usadas en el último cálculo.'
+    )
+
+    lineas_reutilizadas = fields.Boolean(
+        string='Líneas reutilizadas',
+        readonly=True,
+        copy=False,
+        help='Las líneas del último cálculo se copiaron de una nómina con las mismas entradas.'
+    )
+
+    @api.model_cr_context
+    def _auto_init(self):
+        res = super(HrPayslip, self)._auto_init()
+        tools.create_index(self._cr, 'hr_payslip_employee_period_index',
+                           self._table, ['employee_id', 'date_from', 'date_to'])
+        # one payslip per employee and run, so that concurrent slices of a run
+        # cannot both create it
+        if not tools.index_exists(self._cr, 'hr_payslip_run_employee_uniq'):
+            self._cr.execute("""
+                SELECT 1 FROM hr_payslip
+                 WHERE payslip_run_id IS NOT NULL AND state != 'cancel'
+              GROUP BY payslip_run_id, employee_id
+                HAVING count(*) > 1
+                 LIMIT 1
+            """)
+            if self._cr.fetchone():
+                _logger.warning('Some payslip runs hold several payslips of the same employee, '
+                                'index hr_payslip_run_employee_uniq not created')
+            else:
+                self._cr.execute("""
+                    CREATE UNIQUE INDEX hr_payslip_run_employee_uniq ON hr_payslip (payslip_run_id, employee_id)
+                     WHERE state != 'cancel'
+                """)
+        return res
+
+    @api.model
+    def mark_stale(self, domain):
+        """ Flag the draft payslips matching ``domain`` as stale. """
+        payslips = self.search([('state', '=', 'draft'), ('desactualizada', '=', False)] + domain)
+        payslips.write({'desactualizada': True})
+        return payslips
+
+    @api.multi
+    def _refresh_leaves_and_inputs(self):
+        """ Replace the leave lines and the contract-based inputs of the
+        payslips, keeping the overtime hours entered by hand. """
+        Aggregate = self.env['hr.leave.aggregate']
+        for payslip in self:
+            contract = payslip.contract_id
+            worked_days = [(2, line.id) for line in payslip.worked_days_line_ids
+                           if line.code not in WORKED_DAY_CODES]
+            if contract.resource_calendar_id:
+                worked_days += [(0, 0, line) for line in Aggregate._get_leave_lines(
+                    contract, payslip.date_from, payslip.date_to)]
+            inputs = [(1, line.id, {'amount': contract.rodamiento})
+                      for line in payslip.input_line_ids if line.code == 'RODAMIENTO']
+            payslip.write({'worked_days_line_ids': worked_days, 'input_line_ids': inputs})
+
+    @api.multi
+    def _compute_input_hash(self):
+        """ Return a dict {payslip id: hash} of everything the salary rules
+        read: the contract fields, the worked days, the inputs and the version
+        of every rule of the structure (parameter rules included). """
+        rule_versions = {}
+        contract_values = {
+            contract['id']: contract
+            for contract in self.mapped('contract_id').read(list(STALE_CONTRACT_FIELDS) + ['struct_id'])
+        }
+        hashes = {}
+        for payslip in self:
+            struct = payslip.struct_id or payslip.contract_id.struct_id
+            if struct.id not in rule_versions:
+                rules = self.env['hr.salary.rule'].browse(
+                    [rule_id for rule_id, sequence in struct._get_parent_structure().get_all_rules()])
+                rule_versions[struct.id] = sorted(
+                    (rule['id'], str(rule['write_date'])) for rule in rules.read(['write_date']))
+            payload = {
+                'struct': struct.id,
+                'rules': rule_versions[struct.id],
+                'contract': contract_values.get(payslip.contract_id.id),
+                'worked_days': sorted(
+                    (line.code, line.number_of_days, line.number_of_hours, line.contract_id.id)
+                    for line in payslip.worked_days_line_ids),
+                'inputs': sorted(
+                    (line.code, line.amount, line.contract_id.id)
+                    for line in payslip.input_line_ids),
+            }
+            hashes[payslip.id] = hashlib.sha1(
+                json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+        return hashes
+
+    @api.multi
+    def _reuse_lines(self, hashes):
+        """ Give the payslips whose inputs did not change the lines already
+        computed for the same inputs, and return the payslips left to compute. """
+        sources = {}
+        for source in self.search([
+            ('hash_entradas', 'in', list(set(hashes.values()))),
+            ('state', '!=', 'cancel'),
+            ('lineas_archivadas', '=', False),
+            ('line_ids', '!=', False),
+        ], order='date_to desc, id desc'):
+            sources.setdefault(source.hash_entradas, source)
+
+        PayslipLine = self.env['hr.payslip.line']
+        fnames = [name for name, field in PayslipLine._fields.items()
+                  if field.store and field.type not in ('one2many', 'many2many')
+                  and name not in LINE_COPY_EXCLUDED_FIELDS]
+        to_compute = self.browse()
+        vals_list = []
+        for payslip in self:
+            source = sources.get(hashes[payslip.id])
+            if not source or payslip.lineas_archivadas:
+                to_compute |= payslip
+                continue
+            if source == payslip:
+                continue
+            payslip.line_ids.unlink()
+            for line in source.line_ids.read(fnames, load='_classic_write'):
+                del line['id']
+                line['slip_id'] = payslip.id
+                vals_list.append(line)
+        PayslipLine.create(vals_list)
+        return to_compute
+
+    @api.multi
+    def _lock_for_compute(self):
+        """ Lock the rows of the payslips being computed, and only them, so
+        that disjoint slices of a run can be computed concurrently. """
+        if not self.ids:
+            return
+        try:
+            with self.env.cr.savepoint(), tools.mute_logger('odoo.sql_db'):
+                self.env.cr.execute("SELECT id FROM hr_payslip WHERE id IN %s FOR UPDATE NOWAIT",
+                                    [tuple(self.ids)])
+        except psycopg2.OperationalError:
+            raise UserError(_('Algunas de estas nóminas se están calculando en otro proceso. '
+                              'Intente de nuevo cuando termine.'))
+
+    @api.multi
+    def compute_sheet(self):
+        # the computation only writes on the payslips themselves, run level
+        # figures are computed from them
+        self._lock_for_compute()
+        # whatever triggers the computation, stale payslips get their leaves
+        # and inputs refreshed before the flag is cleared
+        self.filtered('desactualizada')._refresh_leaves_and_inputs()
+        hashes = self._compute_input_hash()
+        to_compute = self._reuse_lines(hashes)
+        reused = self - to_compute
+        for payslip in reused.filtered(lambda slip: not slip.number):
+            payslip.number = self.env['ir.sequence'].next_by_code('salary.slip')
+        res = super(HrPayslip, to_compute).compute_sheet()
+        for payslip in self:
+            payslip.write({
+                'hash_entradas': hashes[payslip.id],
+                'lineas_reutilizadas': payslip in reused,
+                'desactualizada': False,
+            })
+        _logger.info('Payslip computation: %d of %d payslips reused cached lines',
+                     len(reused), len(self))
+        return res
+
+
+class HrPayslipRun(models.Model):
+    _inherit = 'hr.payslip.run'
+
+    nominas_recalculadas = fields.Integer(
+        string='Nóminas recalculadas', compute='_compute_run_statistics',
+        help='Nóminas desactualizadas recalculadas en el último recálculo.')
+    nominas_omitidas = fields.Integer(
+        string='Nóminas omitidas', compute='_compute_run_statistics',
+        help='Nóminas que no necesitaban recalcularse en el último recálculo.')
+    nominas_reutilizadas = fields.Integer(
+        string='Nóminas reutilizadas', compute='_compute_run_statistics',
+        help='Nóminas cuyas líneas se reutilizaron en el último cálculo porque sus entradas no cambiaron.')
+    tasa_reutilizacion = fields.Float(string='Tasa de reutilización (%)', compute='_compute_run_statistics')
+    slice_ids = fields.One2many('hr.payslip.run.slice', 'run_id', string='Cálculos parciales', readonly=True)
+    memoria_maxima = fields.Float(
+        string='Memoria máxima (MB)', compute='_compute_run_statistics',
+        help='Memoria máxima del proceso al calcular un bloque de empleados del lote.')
+
+    @api.depends('slip_ids.lineas_reutilizadas', 'slice_ids.memoria_maxima',
+                 'slice_ids.employee_count', 'slice_ids.nominas_omitidas')
+    def _compute_run_statistics(self):
+        counts = {}
+        for group in self.env['hr.payslip'].read_group(
+                [('payslip_run_id', 'in', self.ids)],
+                ['payslip_run_id', 'lineas_reutilizadas'],
+                ['payslip_run_id', 'lineas_reutilizadas'], lazy=False):
+            key = (group['payslip_run_id'][0], group['lineas_reutilizadas'])
+            counts[key] = group['__count']
+        for run in self:
+            reused = counts.get((run.id, True), 0)
+            total = reused + counts.get((run.id, False), 0)
+            run.nominas_reutilizadas = reused
+            run.tasa_reutilizacion = total and 100.0 * reused / total
+            run.memoria_maxima = max(run.slice_ids.mapped('memoria_maxima') or [0.0])
+            last_stale = run.slice_ids.filtered(lambda piece: piece.tipo == 'stale')[-1:]
+            run.nominas_recalculadas = last_stale.employee_count
+            run.nominas_omitidas = last_stale.nominas_omitidas
+
+    @api.multi
+    def _lock_slice_employees(self, employee_ids):
+        """ Lock ``employee_ids`` for the current transaction and return the
+        ones that can be added to the run: those already locked by another
+        slice, or with a payslip in the run that is not cancelled, are left
+        out. Payslips committed by another slice after this transaction
+        started are not visible here, the unique index on the run and the
+        employee rejects those. """
+        self.ensure_one()
+        self.env.cr.execute("""
+            SELECT id FROM unnest(%s::integer[]) AS id
+             WHERE pg_try_advisory_xact_lock(%s, id)
+        """, [list(employee_ids), self.id])
+        locked = {row[0] for row in self.env.cr.fetchall()}
+        existing = set(self.env['hr.payslip'].search([
+            ('payslip_run_id', '=', self.id),
+            ('employee_id', 'in', list(locked)),
+            ('state', '!=', 'cancel'),
+        ]).mapped('employee_id').ids)
+        return [employee_id for employee_id in employee_ids
+                if employee_id in locked and employee_id not in existing]
+
+    @api.multi
+    def action_recompute_stale(self):
+        """ Recompute only the draft payslips flagged as stale. """
+        for run in self:
+            start = time.time()
+            stale = run.slip_ids.filtered(lambda slip: slip.state == 'draft' and slip.desactualizada)
+            stale.compute_sheet()
+            # recorded as a slice, like the wizard, so the run row is not written
+            self.env['hr.payslip.run.slice'].create({
+                'run_id': run.id,
+                'tipo': 'stale',
+                'employee_count': len(stale),
+                'nominas_omitidas': len(run.slip_ids) - len(stale),
+                'duration': time.time() - start,
+            })
+        return True
+
+
+class HrPayslipRunSlice(models.Model):
+    _name = 'hr.payslip.run.slice'
+    _description = 'Cálculo parcial de un lote de nóminas'
+    _order = 'run_id, id'
+
+    run_id = fields.Many2one('hr.payslip.run', string='Lote', required=True, ondelete='cascade', index=True)
+    user_id = fields.Many2one('res.users', string='Usuario', default=lambda self: self.env.user)
+    tipo = fields.Selection([
+        ('generate', 'Generación de nóminas'),
+        ('stale', 'Recálculo de desactualizadas'),
+    ], string='Tipo', required=True, default='generate')
+    employee_count = fields.Integer(string='Nóminas calculadas')
+    nominas_omitidas = fields.Integer(string='Nóminas omitidas')
+    duration = fields.Float(string='Duración (s)')
+    memoria_maxima = fields.Float(string='Memoria máxima (MB)')
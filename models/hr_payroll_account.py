@@ -0,0 +1,179 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import float_compare, float_is_zero
+
+# Contract field holding the entity each deduction is paid to.
+ENTITY_FIELD_BY_CODE = {
+    'SALUD': 'eps',
+    'PENSIÓN': 'fondo_pension',
+    'FSP': 'fondo_pension',
+}
+
+
+class HrPayslipRun(models.Model):
+    _inherit = 'hr.payslip.run'
+
+    contabilizacion_consolidada = fields.Boolean(
+        string='Contabilización consolidada',
+        help='Genera un solo asiento para el lote, agrupado por regla, cuenta y tercero, '
+             'en lugar de un asiento por nómina.'
+    )
+    move_detail_ids = fields.One2many('hr.payslip.run.move.detail', 'run_id',
+                                      string='Detalle por empleado', readonly=True)
+
+    @api.multi
+    def action_confirm_payslips(self):
+        """ Confirm all the pending payslips of the run in a single call, so
+        that consolidated runs are posted as one move. """
+        for run in self:
+            payslips = run.slip_ids.filtered(lambda slip: slip.state in ('draft', 'verify'))
+            if not payslips:
+                raise UserError(_('El lote %s no tiene nóminas por confirmar.') % run.name)
+            payslips.with_context(l10n_co_run_confirmation=True).action_payslip_done()
+        return True
+
+
+class HrPayslipRunMoveDetail(models.Model):
+    _name = 'hr.payslip.run.move.detail'
+    _description = 'Detalle por empleado del asiento consolidado'
+    _order = 'run_id, employee_id, code'
+
+    run_id = fields.Many2one('hr.payslip.run', string='Lote', required=True, ondelete='cascade', index=True)
+    move_id = fields.Many2one('account.move', string='Asiento', ondelete='cascade', index=True)
+    slip_id = fields.Many2one('hr.payslip', string='Nómina', ondelete='cascade')
+    employee_id = fields.Many2one('hr.employee', string='Empleado')
+    code = fields.Char(string='Código')
+    entidad = fields.Char(string='Entidad')
+    account_id = fields.Many2one('account.account', string='Cuenta')
+    partner_id = fields.Many2one('res.partner', string='Tercero')
+    debit = fields.Float(string='Débito')
+    credit = fields.Float(string='Crédito')
+
+
+class HrPayslip(models.Model):
+    _inherit = 'hr.payslip'
+
+    @api.multi
+    def action_payslip_done(self):
+        consolidated = self.filtered(lambda slip: slip.payslip_run_id.contabilizacion_consolidada)
+        if consolidated and not self.env.context.get('l10n_co_run_confirmation'):
+            raise UserError(_('Las nóminas de un lote con contabilización consolidada se confirman '
+                              'desde el lote, con el botón "Confirmar nóminas".'))
+        res = super(HrPayslip, self - consolidated).action_payslip_done()
+        if consolidated:
+            # same as hr_payroll, the per slip posting of hr_payroll_account is replaced
+            # by one move per run
+            consolidated.compute_sheet()
+            consolidated.write({'state': 'done'})
+            for run in consolidated.mapped('payslip_run_id'):
+                consolidated.filtered(lambda slip: slip.payslip_run_id == run)._post_consolidated_move(run)
+        return res
+
+    @api.multi
+    def _post_consolidated_move(self, run):
+        """ Post a single move for the payslips of ``run``, with one line per
+        rule code, account, partner, entity and analytic account. """
+        precision = self.env['decimal.precision'].precision_get('Payroll')
+        journal = run.journal_id
+        date = run.date_end
+        currency = journal.company_id.currency_id
+        grouped = {}
+        details = []
+        for slip in self:
+            for line in slip.details_by_salary_rule_category:
+                amount = currency.round(slip.credit_note and -line.total or line.total)
+                if currency.is_zero(amount):
+                    continue
+                rule = line.salary_rule_id
+                entity = ENTITY_FIELD_BY_CODE.get(line.code) and slip.contract_id[ENTITY_FIELD_BY_CODE[line.code]]
+                analytic_account_id = rule.analytic_account_id.id or slip.contract_id.analytic_account_id.id
+                for account, credit_account in ((rule.account_debit, False), (rule.account_credit, True)):
+                    if not account:
+                        continue
+                    partner_id = line._get_partner_id(credit_account=credit_account)
+                    if credit_account:
+                        debit, credit = max(-amount, 0.0), max(amount, 0.0)
+                    else:
+                        debit, credit = max(amount, 0.0), max(-amount, 0.0)
+                    key = (line.code, account.id, partner_id, entity or False, analytic_account_id,
+                           rule.account_tax_id.id)
+                    values = grouped.setdefault(key, {
+                        'name': entity and '%s - %s' % (line.name, entity) or line.name,
+                        'partner_id': partner_id,
+                        'account_id': account.id,
+                        'journal_id': journal.id,
+                        'date': date,
+                        'debit': 0.0,
+                        'credit': 0.0,
+                        'analytic_account_id': analytic_account_id,
+                        'tax_line_id': rule.account_tax_id.id,
+                    })
+                    values['debit'] += debit
+                    values['credit'] += credit
+                    details.append({
+                        'run_id': run.id,
+                        'slip_id': slip.id,
+                        'employee_id': slip.employee_id.id,
+                        'code': line.code,
+                        'entidad': entity or False,
+                        'account_id': account.id,
+                        'partner_id': partner_id,
+                        'debit': debit,
+                        'credit': credit,
+                    })
+
+        line_ids = []
+        debit_sum = credit_sum = 0.0
+        for values in grouped.values():
+            debit = currency.round(values['debit'])
+            credit = currency.round(values['credit'])
+            # debit and credit of a same key are netted into a single move line
+            values.update(debit=max(debit - credit, 0.0), credit=max(credit - debit, 0.0))
+            debit_sum += values['debit']
+            credit_sum += values['credit']
+            line_ids.append((0, 0, values))
+
+        if float_compare(credit_sum, debit_sum, precision_digits=precision) == -1:
+            account = journal.default_credit_account_id
+            if not account:
+                raise UserError(_('The Expense Journal "%s" has not properly configured the Credit Account!') % journal.name)
+            line_ids.append((0, 0, {
+                'name': _('Adjustment Entry'),
+                'account_id': account.id,
+                'journal_id': journal.id,
+                'date': date,
+                'debit': 0.0,
+                'credit': currency.round(debit_sum - credit_sum),
+            }))
+        elif float_compare(debit_sum, credit_sum, precision_digits=precision) == -1:
+            account = journal.default_debit_account_id
+            if not account:
+                raise UserError(_('The Expense Journal "%s" has not properly configured the Debit Account!') % journal.name)
+            line_ids.append((0, 0, {
+                'name': _('Adjustment Entry'),
+                'account_id': account.id,
+                'journal_id': journal.id,
+                'date': date,
+                'debit': currency.round(credit_sum - debit_sum),
+                'credit': 0.0,
+            }))
+
+        line_ids = [command for command in line_ids
+                    if not (float_is_zero(command[2]['debit'], precision_digits=precision)
+                            and float_is_zero(command[2]['credit'], precision_digits=precision))]
+        move = self.env['account.move'].create({
+            'narration': _('Payslip batch %s') % run.name,
+            'ref': run.name,
+            'journal_id': journal.id,
+            'date': date,
+            'line_ids': line_ids,
+        })
+        for detail in details:
+            detail['move_id'] = move.id
+        self.env['hr.payslip.run.move.detail'].create(details)
+        self.write({'move_id': move.id, 'date': date})
+        move.post()
+        return move
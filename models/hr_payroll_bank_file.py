@@ -0,0 +1,206 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import csv
+import hashlib
+import io
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+BANK_FILE_FIELDS = [
+    ('identification', 'Identificación'),
+    ('employee', 'Empleado'),
+    ('bank', 'Banco'),
+    ('bic', 'Código del banco'),
+    ('account', 'Número de cuenta'),
+    ('amount', 'Valor a pagar'),
+    ('reference', 'Referencia de la nómina'),
+]
+
+# Widths of the control totals line of fixed width layouts: record type,
+# number of payments and total amount (zero filled, implicit decimals).
+TRAILER_WIDTHS = (5, 10, 20)
+
+
+class HrPayrollBankLayout(models.Model):
+    _name = 'hr.payroll.bank.layout'
+    _description = 'Formato de archivo de pago bancario'
+
+    name = fields.Char(string='Nombre', required=True)
+    file_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('fixed', 'Ancho fijo'),
+    ], string='Formato', required=True, default='csv')
+    delimiter = fields.Char(string='Separador', size=1, default=';')
+    header = fields.Boolean(string='Incluir encabezado',
+                            help='Escribe el nombre de las columnas en la primera línea (solo CSV).')
+    trailer = fields.Boolean(string='Incluir totales de control',
+                             help='Escribe al final una línea con el número de pagos y el valor total.')
+    amount_decimals = fields.Integer(
+        string='Decimales', default=2,
+        help='En ancho fijo los valores se escriben sin separador decimal, con este número de decimales implícitos.')
+    column_ids = fields.One2many('hr.payroll.bank.layout.column', 'layout_id', string='Columnas', copy=True)
+
+    @api.multi
+    def _round_amount(self, amount):
+        """ Return ``amount`` as the integer number of units of the last
+        decimal written in the file. """
+        self.ensure_one()
+        return int(round(amount * 10 ** self.amount_decimals))
+
+    @api.multi
+    def _format_amount(self, amount):
+        self.ensure_one()
+        units = self._round_amount(amount)
+        if self.file_format == 'fixed':
+            return '%d' % units
+        return '%.*f' % (self.amount_decimals, units / 10 ** self.amount_decimals)
+
+    @api.multi
+    def _format_row(self, values):
+        """ Return the list of cells of a row, already padded for fixed width layouts. """
+        self.ensure_one()
+        cells = []
+        for column in self.column_ids:
+            value = values.get(column.field_name)
+            if column.field_name == 'amount':
+                value = self._format_amount(value)
+            value = '' if value is None else str(value)
+            if self.file_format == 'fixed':
+                fill = column.fill or ' '
+                value = value[:column.width]
+                value = value.rjust(column.width, fill) if column.align == 'right' else value.ljust(column.width, fill)
+            cells.append(value)
+        return cells
+
+
+class HrPayrollBankLayoutColumn(models.Model):
+    _name = 'hr.payroll.bank.layout.column'
+    _description = 'Columna de formato de pago bancario'
+    _order = 'layout_id, sequence, id'
+
+    layout_id = fields.Many2one('hr.payroll.bank.layout', string='Formato', required=True, ondelete='cascade')
+    sequence = fields.Integer(string='Secuencia', default=10)
+    field_name = fields.Selection(BANK_FILE_FIELDS, string='Dato', required=True)
+    width = fields.Integer(string='Ancho', default=20)
+    align = fields.Selection([('left', 'Izquierda'), ('right', 'Derecha')], string='Alineación', default='left')
+    fill = fields.Char(string='Relleno', size=1, default=' ')
+
+
+class HrPayslipRun(models.Model):
+    _inherit = 'hr.payslip.run'
+
+    @api.multi
+    def _iter_bank_payments(self, batch_size=5000):
+        """ Yield the TOTAL_PAGAR of every confirmed payslip of the run with
+        the employee bank account, reading the payslips by keyset batches.
+        Archived lines are read from their archive, and the amount is None
+        for payslips without TOTAL_PAGAR. """
+        self.ensure_one()
+        cr = self.env.cr
+        last_id = 0
+        while True:
+            cr.execute("""
+                SELECT p.id, p.number, p.lineas_archivadas, e.identification_id, e.name,
+                       b.acc_number, bk.name, bk.bic, l.total
+                  FROM hr_payslip p
+             LEFT JOIN hr_payslip_line l ON l.slip_id = p.id AND l.code = 'TOTAL_PAGAR'
+                  JOIN hr_employee e ON e.id = p.employee_id
+             LEFT JOIN res_partner_bank b ON b.id = e.bank_account_id
+             LEFT JOIN res_bank bk ON bk.id = b.bank_id
+                 WHERE p.payslip_run_id = %s AND p.state = 'done' AND p.id > %s
+              ORDER BY p.id
+                 LIMIT %s
+            """, [self.id, last_id, batch_size])
+            rows = cr.fetchall()
+            if not rows:
+                return
+            archived = {}
+            archived_ids = [row[0] for row in rows if row[2] and row[8] is None]
+            if archived_ids:
+                for archive in self.env['hr.payslip.line.archive'].search([('slip_id', 'in', archived_ids)]):
+                    for line in archive._unpack():
+                        if line['code'] == 'TOTAL_PAGAR':
+                            archived[archive.slip_id.id] = line['total']
+            for slip_id, number, _archived, identification, employee, account, bank, bic, amount in rows:
+                yield {
+                    'identification': identification,
+                    'employee': employee,
+                    'bank': bank,
+                    'bic': bic,
+                    'account': account,
+                    'amount': archived.get(slip_id) if amount is None else amount,
+                    'reference': number,
+                }
+            last_id = rows[-1][0]
+
+    @api.multi
+    def _write_bank_file(self, layout, path):
+        """ Write the bank payment file of the run to ``path`` and return its
+        control totals. Payslips without TOTAL_PAGAR, of employees without
+        bank account or with a non positive amount are left out and counted.
+        The checksum is the SHA-1 of the bytes of the file. """
+        self.ensure_one()
+        totals = {'count': 0, 'amount': 0.0, 'without_total': 0, 'without_account': 0, 'not_positive': 0}
+        checksum = hashlib.sha1()
+        units = 0
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=layout.delimiter or ';', lineterminator='\r\n')
+        with open(path, 'wb') as bank_file:
+
+            def write(cells):
+                if layout.file_format == 'fixed':
+                    line = ''.join(cells) + '\r\n'
+                else:
+                    buffer.seek(0)
+                    buffer.truncate()
+                    writer.writerow(cells)
+                    line = buffer.getvalue()
+                data = line.encode('utf-8')
+                bank_file.write(data)
+                checksum.update(data)
+
+            if layout.header and layout.file_format == 'csv':
+                labels = dict(BANK_FILE_FIELDS)
+                write([labels[column.field_name] for column in layout.column_ids])
+            for payment in self._iter_bank_payments():
+                if payment['amount'] is None:
+                    totals['without_total'] += 1
+                    continue
+                if not payment['account']:
+                    totals['without_account'] += 1
+                    continue
+                if payment['amount'] <= 0:
+                    totals['not_positive'] += 1
+                    continue
+                write(layout._format_row(payment))
+                totals['count'] += 1
+                # the control total adds the amounts as written, not the raw ones
+                units += layout._round_amount(payment['amount'])
+            totals['amount'] = units / 10 ** layout.amount_decimals
+            if layout.trailer:
+                cells = ['TOTAL', str(totals['count']), layout._format_amount(totals['amount'])]
+                if layout.file_format == 'fixed':
+                    cells = [cells[0].ljust(TRAILER_WIDTHS[0])] + [
+                        cell.rjust(width, '0') for cell, width in zip(cells[1:], TRAILER_WIDTHS[1:])]
+                    # the control line is as long as the payment lines
+                    row_width = sum(layout.column_ids.mapped('width'))
+                    cells[-1] = cells[-1].ljust(row_width - sum(TRAILER_WIDTHS) + TRAILER_WIDTHS[-1])
+                write(cells)
+        totals['checksum'] = checksum.hexdigest()
+        return totals
+
+    @api.multi
+    def action_bank_file(self):
+        self.ensure_one()
+        if self.state != 'close':
+            raise UserError(_('El archivo de pago solo se puede generar para lotes cerrados.'))
+        return {
+            'name': _('Archivo de pago bancario'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'hr.payroll.bank.file',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_run_id': self.id},
+        }
@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import json
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import ValidationError
+
+
+class HrPayslip(models.Model):
+    _inherit = 'hr.payslip'
+
+    @api.model_cr_context
+    def _auto_init(self):
+        res = super(HrPayslip, self)._auto_init()
+        tools.create_index(self._cr, 'hr_payslip_date_to_id_index',
+                           self._table, ['date_to', 'id'])
+        return res
+
+    @api.model
+    def export_period(self, date_from, date_to, cursor=None, limit=1000):
+        """ Export the payslips whose period ends between ``date_from`` and
+        ``date_to`` with their lines, one JSON document per line.
+
+        Pages are read with keyset pagination on ``(date_to, id)``: ``cursor``
+        is the value returned with the previous page (None for the first one),
+        so every page costs the same whatever its depth. Record rules apply.
+
+        :return: tuple (JSON lines, cursor of the next page or None)
+        """
+        try:
+            date_from = fields.Date.to_date(date_from)
+            date_to = fields.Date.to_date(date_to)
+            cursor_date, cursor_id = cursor.split(',') if cursor else (date_from, 0)
+            cursor_date, cursor_id = fields.Date.to_date(cursor_date), int(cursor_id)
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValidationError(_('Parámetros de exportación inválidos.'))
+        if not date_from or not date_to or not cursor_date or limit <= 0:
+            raise ValidationError(_('Parámetros de exportación inválidos.'))
+
+        self.check_access_rights('read')
+        query = self._where_calc([('date_to', '>=', date_from), ('date_to', '<=', date_to)])
+        self._apply_ir_rules(query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT p.id, p.number, p.employee_id, e.name AS employee, p.date_from, p.date_to,
+                   p.state, p.lineas_archivadas, c.eps, c.fondo_pension, c.caja_compensacion
+              FROM hr_payslip p
+              JOIN hr_employee e ON e.id = p.employee_id
+         LEFT JOIN hr_contract c ON c.id = p.contract_id
+             WHERE p.id IN (SELECT "hr_payslip".id FROM %s
+                             WHERE %s AND ("hr_payslip".date_to, "hr_payslip".id) > (%%s, %%s)
+                          ORDER BY "hr_payslip".date_to, "hr_payslip".id
+                             LIMIT %%s)
+          ORDER BY p.date_to, p.id
+        """ % (from_clause, where_clause), where_params + [cursor_date, cursor_id, limit])
+        slips = cr.dictfetchall()
+        if not slips:
+            return [], None
+
+        lines = {slip['id']: [] for slip in slips}
+        cr.execute("""
+            SELECT l.slip_id, l.code, c.code, l.total
+              FROM hr_payslip_line l
+         LEFT JOIN hr_salary_rule_category c ON c.id = l.category_id
+             WHERE l.slip_id IN %s
+          ORDER BY l.slip_id, l.sequence, l.id
+        """, [tuple(lines)])
+        for slip_id, code, category, total in cr.fetchall():
+            lines[slip_id].append([code, category, total])
+        archived = [slip['id'] for slip in slips if slip['lineas_archivadas']]
+        if archived:
+            for archive in self.env['hr.payslip.line.archive'].search([('slip_id', 'in', archived)]):
+                lines[archive.slip_id.id] = [[line['code'], line['category_code'], line['total']]
+                                             for line in archive._unpack()]
+
+        res = []
+        for slip in slips:
+            res.append(json.dumps({
+                'id': slip['id'],
+                'number': slip['number'],
+                'employee_id': slip['employee_id'],
+                'employee': slip['employee'],
+                'date_from': fields.Date.to_string(slip['date_from']),
+                'date_to': fields.Date.to_string(slip['date_to']),
+                'state': slip['state'],
+                'eps': slip['eps'],
+                'fondo_pension': slip['fondo_pension'],
+                'caja_compensacion': slip['caja_compensacion'],
+                'lines': lines[slip['id']],
+            }, separators=(',', ':')))
+        last = slips[-1]
+        next_cursor = None
+        if len(slips) == limit:
+            next_cursor = '%s,%s' % (fields.Date.to_string(last['date_to']), last['id'])
+        return res, next_cursor
@@ -0,0 +1,288 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import base64
+import json
+import logging
+import zlib
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Columns kept for every archived line, stored column by column so that
+# repeated codes and categories compress well.
+ARCHIVE_COLUMNS = (
+    'salary_rule_id', 'contract_id', 'employee_id', 'category_id', 'register_id',
+    'name', 'code', 'sequence', 'appears_on_payslip', 'amount_select',
+    'quantity', 'rate', 'amount', 'total',
+)
+
+
+class HrPayslipLineArchive(models.Model):
+    _name = 'hr.payslip.line.archive'
+    _description = 'Líneas de nómina archivadas'
+    _rec_name = 'slip_id'
+
+    slip_id = fields.Many2one('hr.payslip', string='Nómina', required=True,
+                              ondelete='cascade', index=True)
+    line_count = fields.Integer(string='Número de líneas', readonly=True)
+    data = fields.Binary(string='Líneas comprimidas', attachment=False, readonly=True)
+    original_size = fields.Integer(string='Tamaño original (bytes)', readonly=True,
+                                   help='Espacio ocupado por las líneas en la tabla hr_payslip_line.')
+    compressed_size = fields.Integer(string='Tamaño comprimido (bytes)', readonly=True)
+
+    _sql_constraints = [
+        ('slip_uniq', 'unique(slip_id)', 'Una nómina solo puede tener un archivo de líneas.'),
+    ]
+
+    @api.model
+    def _pack(self, lines):
+        columns = {column: [] for column in ARCHIVE_COLUMNS}
+        columns['category_code'] = []
+        for line in lines:
+            for column in ARCHIVE_COLUMNS:
+                columns[column].append(line[column])
+            columns['category_code'].append(line['category_code'])
+        return zlib.compress(json.dumps(columns, separators=(',', ':')).encode(), 9)
+
+    @api.multi
+    def _unpack(self):
+        """ Return the archived lines as a list of dicts, in their original order. """
+        self.ensure_one()
+        columns = json.loads(zlib.decompress(base64.b64decode(self.data)).decode())
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+
+    @api.model
+    def _archive_payslips(self, payslips):
+        """ Move the lines of ``payslips`` into one compressed row per slip. """
+        payslips = payslips.filtered(lambda slip: slip.state == 'done' and not slip.lineas_archivadas)
+        if not payslips:
+            return self.browse()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT l.slip_id, sum(pg_column_size(l.*))
+              FROM hr_payslip_line l
+             WHERE l.slip_id IN %s
+          GROUP BY l.slip_id
+        """, [tuple(payslips.ids)])
+        sizes = dict(cr.fetchall())
+        cr.execute("""
+            SELECT l.slip_id, l.salary_rule_id, l.contract_id, l.employee_id, l.category_id,
+                   l.register_id, l.name, l.code, l.sequence, l.appears_on_payslip,
+                   l.amount_select, l.quantity, l.rate, l.amount, l.total,
+                   c.code AS category_code
+              FROM hr_payslip_line l
+         LEFT JOIN hr_salary_rule_category c ON c.id = l.category_id
+             WHERE l.slip_id IN %s
+          ORDER BY l.slip_id, l.sequence, l.id
+        """, [tuple(payslips.ids)])
+        lines_by_slip = {}
+        for line in cr.dictfetchall():
+            lines_by_slip.setdefault(line.pop('slip_id'), []).append(line)
+
+        vals_list = []
+        for slip_id, lines in lines_by_slip.items():
+            data = base64.b64encode(self._pack(lines))
+            vals_list.append({
+                'slip_id': slip_id,
+                'line_count': len(lines),
+                'data': data,
+                'original_size': sizes.get(slip_id, 0),
+                # the column stores the base64 text, not the raw zlib stream
+                'compressed_size': len(data),
+            })
+        if not lines_by_slip:
+            return self.browse()
+        archives = self.create(vals_list)
+        cr.execute("DELETE FROM hr_payslip_line WHERE slip_id IN %s", [tuple(lines_by_slip)])
+        archived = payslips.browse(list(lines_by_slip))
+        archived.write({'lineas_archivadas': True})
+        archived.invalidate_cache(['line_ids'])
+        return archives
+
+    @api.multi
+    def restore(self):
+        """ Recreate the archived lines as regular ``hr.payslip.line`` records. """
+        vals_list = []
+        for archive in self:
+            for line in archive._unpack():
+                line.pop('total')
+                line.pop('category_code')
+                line['slip_id'] = archive.slip_id.id
+                vals_list.append(line)
+        self.env['hr.payslip.line'].create(vals_list)
+        self.mapped('slip_id').write({'lineas_archivadas': False})
+        self.unlink()
+        return True
+
+    @api.model
+    def _get_totals(self, slip_ids, codes):
+        """ Return the totals of the archived lines of ``slip_ids`` whose code
+        is in ``codes``, as a dict {slip id: {code: total}}. """
+        res = {}
+        for archive in self.search([('slip_id', 'in', list(slip_ids))]):
+            totals = res.setdefault(archive.slip_id.id, {})
+            for line in archive._unpack():
+                if line['code'] in codes:
+                    totals[line['code']] = totals.get(line['code'], 0.0) + line['total']
+        return res
+
+    @api.model
+    def _cron_archive_closed_periods(self, batch_size=500):
+        """ Archive the lines of confirmed payslips older than the retention
+        period (``l10n_co_hr_payroll.archive_months``, 12 months by default). """
+        months = int(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_co_hr_payroll.archive_months', 12))
+        limit_date = fields.Date.today() - relativedelta(months=months)
+        domain = [
+            ('state', '=', 'done'),
+            ('lineas_archivadas', '=', False),
+            ('line_ids', '!=', False),
+            ('date_to', '<', limit_date),
+            '|', ('payslip_run_id', '=', False), ('payslip_run_id.state', '=', 'close'),
+        ]
+        original_size = compressed_size = count = 0
+        while True:
+            payslips = self.env['hr.payslip'].search(domain, limit=batch_size)
+            if not payslips:
+                break
+            archives = self._archive_payslips(payslips)
+            if not archives:
+                break
+            count += len(archives)
+            original_size += sum(archives.mapped('original_size'))
+            compressed_size += sum(archives.mapped('compressed_size'))
+            self.env.cr.commit()
+            self.env.clear()
+        if count:
+            _logger.info('Archived the lines of %d payslips: %d bytes -> %d bytes (%.1f%%)',
+                         count, original_size, compressed_size,
+                         100.0 * compressed_size / (original_size or 1))
+        return count
+
+
+class HrPayslip(models.Model):
+    _inherit = 'hr.payslip'
+
+    lineas_archivadas = fields.Boolean(
+        string='Líneas archivadas',
+        readonly=True,
+        copy=False,
+        help='Las líneas de esta nómina fueron archivadas en formato comprimido.'
+    )
+
+    @api.multi
+    def _l10n_co_load_archived_lines(self):
+        """ Put the archived lines of the payslips in the cache as in-memory
+        records so that reports reading ``line_ids`` keep working. """
+        archived = self.filtered('lineas_archivadas')
+        if not archived:
+            return
+        PayslipLine = self.env['hr.payslip.line']
+        archives = self.env['hr.payslip.line.archive'].search([('slip_id', 'in', archived.ids)])
+        for archive in archives:
+            lines = PayslipLine
+            for line in archive._unpack():
+                line.pop('category_code')
+                lines |= PayslipLine.new(dict(line, slip_id=archive.slip_id.id))
+            self.env.cache.set(archive.slip_id, self._fields['line_ids'], tuple(lines.ids))
+        self.env.cache.invalidate([(self._fields['details_by_salary_rule_category'], archived.ids)])
+
+    @api.multi
+    def action_restore_lines(self):
+        archives = self.env['hr.payslip.line.archive'].search([('slip_id', 'in', self.ids)])
+        if not archives:
+            raise UserError(_('Las nóminas seleccionadas no tienen líneas archivadas.'))
+        return archives.restore()
+
+    @api.multi
+    def compute_sheet(self):
+        if any(self.mapped('lineas_archivadas')):
+            raise UserError(_('Restaure las líneas archivadas antes de recalcular la nómina.'))
+        return super(HrPayslip, self).compute_sheet()
+
+
+class PayslipReport(models.AbstractModel):
+    _name = 'report.hr_payroll.report_payslip'
+    _description = 'Payslip Report'
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        payslips = self.env['hr.payslip'].browse(docids)
+        payslips._l10n_co_load_archived_lines()
+        return {
+            'doc_ids': docids,
+            'doc_model': 'hr.payslip',
+            'docs': payslips,
+            'data': data,
+        }
+
+
+class PayslipDetailsReport(models.AbstractModel):
+    _inherit = 'report.hr_payroll.report_payslipdetails'
+
+    def get_details_by_rule_category(self, payslip_lines):
+        """ Group the archived lines, which only exist in memory, in Python:
+        the standard grouping selects the lines from hr_payslip_line. """
+        stored = payslip_lines.filtered(lambda line: isinstance(line.id, int))
+        res = super(PayslipDetailsReport, self).get_details_by_rule_category(stored)
+        archived = payslip_lines - stored
+        lines_by_slip = {}
+        for line in archived.sorted(lambda line: (line.sequence, line.category_id.parent_id.id or 0)):
+            categories = lines_by_slip.setdefault(line.slip_id.id, {})
+            categories.setdefault(line.category_id, self.env['hr.payslip.line'])
+            categories[line.category_id] |= line
+        for slip_id, categories in lines_by_slip.items():
+            details = res.setdefault(slip_id, [])
+            for category, lines in categories.items():
+                level = 0
+                parents = [category]
+                while parents[-1].parent_id:
+                    parents.append(parents[-1].parent_id)
+                for parent in parents:
+                    details.append({
+                        'rule_category': parent.name,
+                        'name': parent.name,
+                        'code': parent.code,
+                        'level': level,
+                        'total': sum(lines.mapped('total')),
+                    })
+                    level += 1
+                for line in lines:
+                    details.append({
+                        'rule_category': line.name,
+                        'name': line.name,
+                        'code': line.code,
+                        'total': line.total,
+                        'level': level,
+                    })
+        return res
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        self.env['hr.payslip'].browse(docids)._l10n_co_load_archived_lines()
+        return super(PayslipDetailsReport, self)._get_report_values(docids, data=data)
+
+
+class ContributionRegisterReport(models.AbstractModel):
+    _inherit = 'report.hr_payroll.report_contributionregister'
+
+    def _get_payslip_lines(self, register_ids, date_from, date_to):
+        result = super(ContributionRegisterReport, self)._get_payslip_lines(register_ids, date_from, date_to)
+        payslips = self.env['hr.payslip'].search([
+            ('lineas_archivadas', '=', True),
+            ('state', '=', 'done'),
+            ('date_from', '>=', date_from),
+            ('date_to', '<=', date_to),
+        ])
+        payslips._l10n_co_load_archived_lines()
+        for line in payslips.mapped('line_ids').sorted(lambda line: (line.slip_id.id, line.sequence)):
+            if line.register_id.id in register_ids:
+                result.setdefault(line.register_id.id, self.env['hr.payslip.line'])
+                result[line.register_id.id] |= line
+        return result
@@ -0,0 +1,158 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, tools, _
+
+TOTAL_CODES = ('TOTAL_DEVENGOS', 'TOTAL_DEDUCCIONES', 'TOTAL_PAGAR')
+OVERTIME_CODES = ('HED', 'HEN', 'HEF', 'HEFN')
+VARIANCE_CODES = TOTAL_CODES + OVERTIME_CODES + ('COMISION', 'FSP')
+
+
+class HrPayslipLine(models.Model):
+    _inherit = 'hr.payslip.line'
+
+    @api.model_cr_context
+    def _auto_init(self):
+        res = super(HrPayslipLine, self)._auto_init()
+        tools.create_index(self._cr, 'hr_payslip_line_slip_code_index',
+                           self._table, ['slip_id', 'code'])
+        return res
+
+
+class HrPayslipRun(models.Model):
+    _inherit = 'hr.payslip.run'
+
+    umbral_variacion = fields.Float(
+        string='Umbral de variación (%)',
+        default=20.0,
+        help='Variación frente al periodo anterior a partir de la cual una nómina se marca para revisión.'
+    )
+
+    @api.model
+    def _variance_amounts_query(self, slip_query):
+        """ Return the query pivoting the amounts of ``VARIANCE_CODES`` into one
+        row per payslip selected by ``slip_query`` (columns id, employee_id). """
+        columns = ', '.join(
+            'coalesce(sum(l.total) FILTER (WHERE l.code = %s), 0)' for code in VARIANCE_CODES)
+        return """
+            WITH slips AS (%s)
+            SELECT s.id, s.employee_id, %s
+              FROM slips s
+         LEFT JOIN hr_payslip_line l ON l.slip_id = s.id AND l.code IN %%s
+          GROUP BY s.id, s.employee_id
+        """ % (slip_query, columns)
+
+    @api.multi
+    def _get_variances(self):
+        """ Compare every payslip of the run with the previous confirmed payslip
+        of the employee and return the flagged ones as a list of dicts. """
+        self.ensure_one()
+        cr = self.env.cr
+        params = list(VARIANCE_CODES) + [VARIANCE_CODES]
+        cr.execute(self._variance_amounts_query("""
+            SELECT id, employee_id FROM hr_payslip
+             WHERE payslip_run_id = %s AND state != 'cancel'
+        """), [self.id] + params)
+        current = cr.fetchall()
+        if not current:
+            return []
+        cr.execute(self._variance_amounts_query("""
+            SELECT DISTINCT ON (employee_id) id, employee_id FROM hr_payslip
+             WHERE employee_id IN %s AND date_to < %s AND state = 'done' AND NOT credit_note
+          ORDER BY employee_id, date_to DESC, id DESC
+        """), [tuple(row[1] for row in current), self.date_start] + params)
+        rows = cr.fetchall()
+        previous = {row[1]: row[2:] for row in rows}
+        # the lines of old payslips may have been moved to the archive
+        archived = self.env['hr.payslip'].search([
+            ('id', 'in', [row[0] for row in rows]),
+            ('lineas_archivadas', '=', True),
+        ])
+        totals = self.env['hr.payslip.line.archive']._get_totals(archived.ids, VARIANCE_CODES)
+        for slip in archived:
+            previous[slip.employee_id.id] = tuple(
+                totals.get(slip.id, {}).get(code, 0.0) for code in VARIANCE_CODES)
+
+        threshold = self.umbral_variacion / 100.0
+        index = {code: i for i, code in enumerate(VARIANCE_CODES)}
+        res = []
+        for row in current:
+            slip_id, employee_id, amounts = row[0], row[1], row[2:]
+            before = previous.get(employee_id)
+            flags = []
+            if before is None:
+                flags.append(_('Sin nómina anterior'))
+                before = (0.0,) * len(VARIANCE_CODES)
+            else:
+                for code in TOTAL_CODES:
+                    new, old = amounts[index[code]], before[index[code]]
+                    if abs(new - old) > abs(old) * threshold:
+                        flags.append(_('Variación en %s') % code)
+            overtime = sum(amounts[index[code]] for code in OVERTIME_CODES)
+            previous_overtime = sum(before[index[code]] for code in OVERTIME_CODES)
+            if overtime > previous_overtime * (1 + threshold):
+                flags.append(_('Aumento de horas extras'))
+            if amounts[index['COMISION']] and not before[index['COMISION']]:
+                flags.append(_('Nueva comisión'))
+            if amounts[index['FSP']] and not before[index['FSP']]:
+                flags.append(_('Aparece FSP'))
+            if flags:
+                res.append({
+                    'slip_id': slip_id,
+                    'employee_id': employee_id,
+                    'deltas': {code: amounts[i] - before[i] for i, code in enumerate(VARIANCE_CODES)},
+                    'flags': flags,
+                })
+        return res
+
+    @api.multi
+    def action_open_variances(self):
+        self.ensure_one()
+        Variance = self.env['hr.payslip.variance']
+        Variance.search([('run_id', '=', self.id), ('create_uid', '=', self.env.uid)]).unlink()
+        variances = Variance.create([{
+            'run_id': self.id,
+            'slip_id': variance['slip_id'],
+            'employee_id': variance['employee_id'],
+            'motivos': ', '.join(variance['flags']),
+            'delta_devengos': variance['deltas']['TOTAL_DEVENGOS'],
+            'delta_deducciones': variance['deltas']['TOTAL_DEDUCCIONES'],
+            'delta_pagar': variance['deltas']['TOTAL_PAGAR'],
+            'delta_horas_extras': sum(variance['deltas'][code] for code in OVERTIME_CODES),
+            'delta_comision': variance['deltas']['COMISION'],
+            'delta_fsp': variance['deltas']['FSP'],
+        } for variance in self._get_variances()])
+        return {
+            'name': _('Nóminas con variaciones'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'hr.payslip.variance',
+            'view_mode': 'tree',
+            'domain': [('id', 'in', variances.ids)],
+        }
+
+
+class HrPayslipVariance(models.TransientModel):
+    _name = 'hr.payslip.variance'
+    _description = 'Variación de nómina frente al periodo anterior'
+    _order = 'employee_id'
+
+    run_id = fields.Many2one('hr.payslip.run', string='Lote', required=True, ondelete='cascade')
+    slip_id = fields.Many2one('hr.payslip', string='Nómina', required=True, ondelete='cascade')
+    employee_id = fields.Many2one('hr.employee', string='Empleado')
+    motivos = fields.Char(string='Motivos')
+    delta_devengos = fields.Float(string='Δ Devengos')
+    delta_deducciones = fields.Float(string='Δ Deducciones')
+    delta_pagar = fields.Float(string='Δ Neto a pagar')
+    delta_horas_extras = fields.Float(string='Δ Horas extras')
+    delta_comision = fields.Float(string='Δ Comisión')
+    delta_fsp = fields.Float(string='Δ FSP')
+
+    @api.multi
+    def action_open_payslip(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'hr.payslip',
+            'res_id': self.slip_id.id,
+            'view_mode': 'form',
+        }
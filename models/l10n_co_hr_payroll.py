@@ -5,7 +5,6 @@
 import babel
 from datetime import date, datetime, time
 from dateutil.relativedelta import relativedelta
-from pytz import timezone
 
 from odoo import api, fields, models, tools, _
 from odoo.addons import decimal_precision as dp
@@ -345,32 +344,9 @@ class HrPayslip(models.Model):
             day_to = datetime.combine(
                 fields.Date.from_string(date_to), time.max)
 
-            # compute leave days
-            leaves = {}
-            calendar = contract.resource_calendar_id
-            tz = timezone(calendar.tz)
-            day_leave_intervals = contract.employee_id.list_leaves(
-                day_from, day_to, calendar=contract.resource_calendar_id)
-            for day, hours, leave in day_leave_intervals:
-                holiday = leave.holiday_id
-                current_leave_struct = leaves.setdefault(holiday.holiday_status_id, {
-                    'name': holiday.holiday_status_id.name or _('Global Leaves'),
-                    'sequence': 5,
-                    'code': holiday.holiday_status_id.name or 'GLOBAL',
-                    'number_of_days': 0.0,
-                    'number_of_hours': 0.0,
-                    'contract_id': contract.id,
-                })
-                current_leave_struct['number_of_hours'] += hours
-                work_hours = calendar.get_work_hours_count(
-                    tz.localize(
-                        datetime.combine(day, time.min)),
-                    tz.localize(
-                        datetime.combine(day, time.max)),
-                    compute_leaves=False,
-                )
-                if work_hours:
-                    current_leave_struct['number_of_days'] += hours / work_hours
+            # leave days are aggregated when leaves are approved, modified or refused
+            leaves = self.env['hr.leave.aggregate']._get_leave_lines(
+                contract, day_from.date(), day_to.date())
 
             # compute worked days
             # work_data = contract.employee_id.get_work_days_data(
@@ -424,7 +400,7 @@ class HrPayslip(models.Model):
             res.append(hen)
             res.append(hef)
             res.append(hefn)
-            res.extend(leaves.values())
+            res.extend(leaves)
         return res
 
     @api.model
@@ -0,0 +1,71 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import os
+
+from odoo import api, fields, models, tools, _
+
+
+class HrPayrollBankFile(models.TransientModel):
+    _name = 'hr.payroll.bank.file'
+    _description = 'Generar archivo de pago bancario'
+
+    run_id = fields.Many2one('hr.payslip.run', string='Lote', required=True)
+    layout_id = fields.Many2one('hr.payroll.bank.layout', string='Formato', required=True)
+    state = fields.Selection([('draft', 'Borrador'), ('done', 'Generado')], default='draft')
+    file_name = fields.Char(string='Nombre del archivo', readonly=True)
+    payment_count = fields.Integer(string='Pagos', readonly=True)
+    payment_amount = fields.Float(string='Valor total', readonly=True)
+    without_total = fields.Integer(string='Nóminas sin neto a pagar', readonly=True)
+    without_account = fields.Integer(string='Empleados sin cuenta bancaria', readonly=True)
+    not_positive = fields.Integer(string='Nóminas sin valor a pagar', readonly=True)
+    checksum = fields.Char(string='Huella del archivo', readonly=True)
+
+    @api.multi
+    def _get_file_path(self):
+        self.ensure_one()
+        directory = os.path.join(tools.config['data_dir'], 'l10n_co_hr_payroll', self.env.cr.dbname)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return os.path.join(directory, 'bank_file_%d' % self.id)
+
+    @api.multi
+    def unlink(self):
+        for wizard in self:
+            path = wizard._get_file_path()
+            if os.path.exists(path):
+                os.remove(path)
+        return super(HrPayrollBankFile, self).unlink()
+
+    @api.multi
+    def action_generate(self):
+        self.ensure_one()
+        totals = self.run_id._write_bank_file(self.layout_id, self._get_file_path())
+        extension = 'csv' if self.layout_id.file_format == 'csv' else 'txt'
+        self.write({
+            'state': 'done',
+            'file_name': '%s.%s' % (self.run_id.name, extension),
+            'payment_count': totals['count'],
+            'payment_amount': totals['amount'],
+            'without_total': totals['without_total'],
+            'without_account': totals['without_account'],
+            'not_positive': totals['not_positive'],
+            'checksum': totals['checksum'],
+        })
+        return {
+            'name': _('Archivo de pago bancario'),
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    @api.multi
+    def action_download(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/l10n_co_hr_payroll/bank_file/%d' % self.id,
+            'target': 'self',
+        }
@@ -0,0 +1,107 @@
+# -*- coding:utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+import logging
+import time
+
+import psutil
+import psycopg2
+
+from odoo import api, models, tools, _
+from odoo.exceptions import UserError
+
+from odoo.addons.l10n_co_hr_payroll.models.hr_payroll import STALE_CONTRACT_FIELDS
+
+_logger = logging.getLogger(__name__)
+
+# Contract fields prefetched for every chunk: those read by the Colombian
+# rules plus the ones used to select the contract and its structure.
+PREFETCH_CONTRACT_FIELDS = STALE_CONTRACT_FIELDS + (
+    'employee_id', 'struct_id', 'state', 'date_start', 'date_end',
+    'eps', 'fondo_pension', 'caja_compensacion',
+)
+
+
+class HrPayslipEmployees(models.TransientModel):
+    _inherit = 'hr.payslip.employees'
+
+    @api.multi
+    def compute_sheet(self):
+        """ Generate and compute the payslips of the run by chunks of
+        employees (``l10n_co_hr_payroll.chunk_size``, 200 by default),
+        emptying the record cache between chunks to bound the memory.
+
+        Employees that already have a payslip in the run, or that another
+        slice of the run is computing, are skipped. """
+        [data] = self.read()
+        active_id = self.env.context.get('active_id')
+        if not data['employee_ids']:
+            raise UserError(_("You must select employee(s) to generate payslip(s)."))
+        run = self.env['hr.payslip.run'].browse(active_id)
+        [run_data] = run.read(['date_start', 'date_end', 'credit_note'])
+        from_date = run_data.get('date_start')
+        to_date = run_data.get('date_end')
+        chunk_size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_co_hr_payroll.chunk_size', 200))
+
+        start = time.time()
+        # hr_payroll_account's override, which is not called, passes the
+        # journal of the run to the payslips through the context
+        Payslip = self.env['hr.payslip'].with_context(journal_id=run.journal_id.id)
+        employee_ids = run._lock_slice_employees(data['employee_ids'])
+        skipped = len(data['employee_ids']) - len(employee_ids)
+        if not employee_ids:
+            raise UserError(_('Todos los empleados seleccionados ya tienen nómina en el lote.'))
+        if skipped:
+            _logger.info('Payslip run %s: %d employees skipped, already in the run', active_id, skipped)
+
+        process = psutil.Process()
+        peak_memory = 0
+        for index in range(0, len(employee_ids), chunk_size):
+            employees = self.env['hr.employee'].browse(employee_ids[index:index + chunk_size])
+            contracts = employees.mapped('contract_ids')
+            contracts.read(list(PREFETCH_CONTRACT_FIELDS))
+            contracts.mapped('resource_calendar_id.attendance_ids').read(
+                ['dayofweek', 'hour_from', 'hour_to', 'date_from', 'date_to'])
+
+            vals_list = []
+            for employee in employees:
+                slip_data = Payslip.onchange_employee_id(from_date, to_date, employee.id, contract_id=False)
+                vals_list.append({
+                    'employee_id': employee.id,
+                    'name': slip_data['value'].get('name'),
+                    'struct_id': slip_data['value'].get('struct_id'),
+                    'contract_id': slip_data['value'].get('contract_id'),
+                    'payslip_run_id': active_id,
+                    'input_line_ids': [(0, 0, x) for x in slip_data['value'].get('input_line_ids')],
+                    'worked_days_line_ids': [(0, 0, x) for x in slip_data['value'].get('worked_days_line_ids')],
+                    'date_from': from_date,
+                    'date_to': to_date,
+                    'credit_note': run_data.get('credit_note'),
+                    'company_id': employee.company_id.id,
+                })
+            try:
+                with self.env.cr.savepoint(), tools.mute_logger('odoo.sql_db'):
+                    payslips = Payslip.create(vals_list)
+            except psycopg2.IntegrityError:
+                raise UserError(_('Otro proceso generó nóminas de este lote para algunos de los '
+                                  'empleados seleccionados. Ejecute de nuevo el asistente, '
+                                  'esos empleados se omitirán.'))
+            payslips.compute_sheet()
+
+            Payslip.recompute()
+            memory = process.memory_info().rss
+            peak_memory = max(peak_memory, memory)
+            _logger.info('Payslip run %s: chunk %d-%d computed, %.1f MB used',
+                         active_id, index + 1, index + len(employees), memory / 1024.0 / 1024.0)
+            Payslip.invalidate_cache()
+
+        # the run itself is not written so that several slices can be computed at once
+        self.env['hr.payslip.run.slice'].create({
+            'run_id': run.id,
+            'employee_count': len(employee_ids),
+            'nominas_omitidas': skipped,
+            'duration': time.time() - start,
+            'memoria_maxima': peak_memory / 1024.0 / 1024.0,
+        })
+        return {'type': 'ir.actions.act_window_close'}